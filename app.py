@@ -1,6 +1,15 @@
 import streamlit as st
+import hashlib
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import xlsxwriter
 from io import BytesIO
+from pyarrow import csv as pa_csv
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from string import ascii_uppercase
 
 # --- Configuration for Streamlit Page ---
 st.set_page_config(
@@ -10,23 +19,28 @@ st.set_page_config(
 )
 
 # --- Helper Function for Excel Column Conversion ---
+# Every 1-3 letter Excel column string ('A'..'ZZZ', which covers the 'XFD' sheet limit)
+# mapped to its 0-based column index, built once at import in Excel's column order
+EXCEL_COLUMN_INDEX_MAP = {
+    ''.join(letters): index
+    for index, letters in enumerate(
+        letters
+        for length in range(1, 4)
+        for letters in product(ascii_uppercase, repeat=length)
+    )
+}
+
 def excel_col_to_index(col_str):
     """
     Converts an Excel column string (e.g., 'A', 'AA', 'BI') to a 0-based column index.
     Raises a ValueError if the string is invalid.
     """
     col_str = col_str.upper().strip()
-    index = 0
-    # A=1, B=2, ..., Z=26
-    for char in col_str:
-        if 'A' <= char <= 'Z':
-            # Calculate the 1-based index (e.g., 'B' is 2, 'AA' is 27)
-            index = index * 26 + (ord(char) - ord('A') + 1)
-        else:
-            raise ValueError(f"Invalid character in column string: {col_str}")
-    
-    # Convert 1-based index to 0-based index for Pandas (A=0, B=1)
-    return index - 1
+    # A single hash lookup replaces the digit-by-digit conversion (A=0, B=1, ..., AA=26)
+    index = EXCEL_COLUMN_INDEX_MAP.get(col_str)
+    if index is None:
+        raise ValueError(f"Invalid column string: {col_str}")
+    return index
 
 # --- App Title and Description ---
 st.title("⚡ EnergyAnalyser: Data Consolidation")
@@ -37,159 +51,391 @@ st.markdown("""
 # --- Constants for Data Processing ---
 PSUM_OUTPUT_NAME = 'PSum (W)' 
 
-# Mapping user-friendly format to Python's datetime format strings
+# Number of CSV rows parsed and converted at a time
+CSV_CHUNK_ROWS = 50000
+
+# Placeholder strings some loggers write for missing PSum readings
+PSUM_NA_VALUES = ['---']
+
+# Strings the pyarrow CSV reader treats as missing: its defaults plus the PSum placeholders
+ARROW_NULL_VALUES = pa_csv.ConvertOptions().null_values + PSUM_NA_VALUES
+
+# Mapping user-friendly format to Python's date format strings (the Time column is parsed separately)
 DATE_FORMAT_MAP = {
-    "DD/MM/YYYY": "%d/%m/%Y %H:%M:%S",
-    "YYYY-MM-DD": "%Y-%m-%d %H:%M:%S"
+    "DD/MM/YYYY": "%d/%m/%Y",
+    "YYYY-MM-DD": "%Y-%m-%d"
 }
 
-# --- Function to Process Data ---
-def process_uploaded_files(uploaded_files, file_configs):
+# Format of the Time column
+TIME_FORMAT = "%H:%M:%S"
+
+# --- Helper Function for Parsing Repeated Date and Time Strings ---
+def parse_repeated_strings(series, format_string):
     """
-    Reads multiple CSV files, extracts configured columns, cleans PSum data, 
-    and returns a dictionary of DataFrames based on individual file configurations.
+    Parses a Series of date or time strings with an explicit format into a datetime64 array.
+    Logger files repeat each date and time-of-day many times, so every distinct string is
+    parsed only once and the results are gathered back by position. Unparseable or
+    missing strings become NaT.
     """
-    processed_data = {}
+    codes, uniques = pd.factorize(series)
+    parsed = pd.to_datetime(uniques, errors='coerce', format=format_string).to_numpy()
+    # Missing values have code -1, which picks the NaT appended at the end
+    parsed = np.append(parsed, np.datetime64('NaT'))
+    return parsed[codes]
+
+
+# --- Helper Function for Date and Time Output Strings ---
+def format_date_time_strings(datetime_series):
+    """
+    Formats a datetime Series as 'DD/MM/YYYY' Date and 'HH:MM:SS' Time strings.
+    Equivalent to dt.strftime, but rearranges the bytes of NumPy's ISO text
+    ('YYYY-MM-DDTHH:MM:SS') in bulk instead of formatting each timestamp in Python.
+    Missing timestamps (NaT) become missing strings. Both Series use the
+    Arrow-backed 'string[pyarrow]' dtype.
+    """
+    values = datetime_series.to_numpy(dtype='datetime64[s]')
+    iso_chars = values.astype('S19').view('S1').reshape(-1, 19)
+    
+    # Day, month and year are copied around fixed '/' separators
+    date_chars = np.full((len(values), 10), b'/', dtype='S1')
+    date_chars[:, 0:2] = iso_chars[:, 8:10]
+    date_chars[:, 3:5] = iso_chars[:, 5:7]
+    date_chars[:, 6:10] = iso_chars[:, 0:4]
+    time_chars = np.ascontiguousarray(iso_chars[:, 11:19])
     
-    for i, uploaded_file in enumerate(uploaded_files):
-        filename = uploaded_file.name
-        config = file_configs[i] # Get the specific configuration for this file
+    # Arrow-backed strings avoid one Python object per cell in the frames kept for preview and export
+    missing = np.isnat(values)
+    date_strings = pd.Series(
+        date_chars.view('S10').ravel().astype('U10'), index=datetime_series.index, dtype='string[pyarrow]'
+    ).mask(missing)
+    time_strings = pd.Series(
+        time_chars.view('S8').ravel().astype('U8'), index=datetime_series.index, dtype='string[pyarrow]'
+    ).mask(missing)
+    return date_strings, time_strings
+
+
+# --- Function to Format Parsed CSV Chunks ---
+def format_csv_chunks(reader, column_order, column_names, date_format_string):
+    """
+    Converts each chunk from a read_csv reader into the Date, Time and PSum output columns.
+    Returns the list of formatted chunks and the number of successfully parsed dates.
+    """
+    final_chunks = []
+    valid_dates_count = 0
+    for chunk in reader:
+        # take() already returns a new frame in Date, Time, PSum order, so no extra copy is needed
+        df_extracted = chunk.take(column_order, axis=1)
         
+        # 4. Rename the columns to the final names for output
+        df_extracted.columns = column_names
+        
+        # 5. Data Cleaning: Convert PSum to numeric, handling potential errors (no-op if already float)
+        df_extracted[PSUM_OUTPUT_NAME] = pd.to_numeric(
+            df_extracted[PSUM_OUTPUT_NAME], 
+            errors='coerce' # Convert non-numeric values to NaN
+        )
+
+        # 6. Parse Date and Time separately and add them as datetime64 values, with no per-row string concatenation
+        dates = parse_repeated_strings(df_extracted['Date'], date_format_string)
+        times = parse_repeated_strings(df_extracted['Time'], TIME_FORMAT)
+        # The time-of-day offset is taken from each parsed time's own day, whatever date the parser assigned it
+        datetime_series = pd.Series(dates + (times - times.astype('datetime64[D]')), index=df_extracted.index)
+        valid_dates_count += datetime_series.count()
+
+        # GUARANTEE SEPARATION: Overwrite Date and Time in place with the separated strings.
+        # The columns are already in Date, Time, PSum order, so PSum is kept without copying it
+        # into a new DataFrame. Output Date is consistently DD/MM/YYYY.
+        df_extracted['Date'], df_extracted['Time'] = format_date_time_strings(datetime_series)
+        final_chunks.append(df_extracted)
+        
+    return final_chunks, valid_dates_count
+
+
+# --- Function to Parse a File Configuration ---
+def parse_file_config(config):
+    """
+    Converts one file's configuration into the column indices and read settings used for parsing.
+    Raises a ValueError if a column letter is invalid.
+    """
+    return {
+        # Convert user-defined column letters to 0-based indices
+        'date_col_index': excel_col_to_index(config['date_col_str']),
+        'time_col_index': excel_col_to_index(config['time_col_str']),
+        'ps_um_col_index': excel_col_to_index(config['psum_col_str']),
+        'header_index': int(config['start_row_num']) - 1, # 0-based index for Pandas header argument
+        'date_format_string': DATE_FORMAT_MAP.get(config['selected_date_format']),
+        'separator': config['delimiter_input'],
+    }
+
+
+# --- Function to Process a Single File ---
+def process_single_file(filename, file_bytes, config, settings):
+    """
+    Reads one CSV file from its raw bytes, extracts its configured columns and cleans PSum data.
+    settings holds the already validated values from parse_file_config.
+    Returns a tuple (sheet_name, DataFrame, message). On failure the first two
+    entries are None and message is a ('error' or 'warning', text) pair, so the
+    caller can report it from the main script thread.
+    """
+    csv_file = BytesIO(file_bytes)
+    date_col_index = settings['date_col_index']
+    time_col_index = settings['time_col_index']
+    ps_um_col_index = settings['ps_um_col_index']
+    header_index = settings['header_index']
+    date_format_string = settings['date_format_string']
+    separator = settings['separator']
+    
+    # Define the columns to extract for this file
+    columns_to_extract = {
+        date_col_index: 'Date',
+        time_col_index: 'Time',
+        ps_um_col_index: PSUM_OUTPUT_NAME
+    }
+    col_indices = list(columns_to_extract.keys())
+    
+    try:
+        # 1. Read only the header row to check the column count before parsing any data
+        header_columns = pd.read_csv(
+            csv_file, 
+            header=header_index, 
+            encoding='ISO-8859-1', 
+            sep=separator, # Use the file's selected separator
+            nrows=0
+        ).columns
+        csv_file.seek(0) # Rewind so the full read starts from the top of the file
+        
+        # 2. Check if the file has enough columns
+        max_index = max(col_indices)
+        if len(header_columns) < max_index + 1:
+             return None, None, ('error', f"File **{filename}** failed to read data correctly. It only has {len(header_columns)} columns. This usually means the **CSV Delimiter** ('{separator}') is incorrect for this file.")
+
+        # 3. Read the CSV with pyarrow's multi-threaded parser, decoding only the required columns
+        column_names = [header_columns[i] for i in col_indices]
         try:
-            # Convert user-defined column letters to 0-based indices
-            date_col_index = excel_col_to_index(config['date_col_str'])
-            time_col_index = excel_col_to_index(config['time_col_str'])
-            ps_um_col_index = excel_col_to_index(config['psum_col_str'])
-            
-            # Define the columns to extract for this file
-            columns_to_extract = {
-                date_col_index: 'Date',
-                time_col_index: 'Time',
-                ps_um_col_index: PSUM_OUTPUT_NAME
-            }
-            col_indices = list(columns_to_extract.keys())
-            
-            # Check for unique indices
-            if len(set(col_indices)) != 3:
-                st.error(f"Error for file **{filename}**: Date, Time, and PSum must be extracted from three unique column indices. Check columns {config['date_col_str']}, {config['time_col_str']}, {config['psum_col_str']}.")
-                continue
-                
-            header_index = int(config['start_row_num']) - 1 # 0-based index for Pandas header argument
-            date_format_string = DATE_FORMAT_MAP.get(config['selected_date_format'])
-            separator = config['delimiter_input']
-            
-            # 1. Read the CSV using the specified settings
-            df_full = pd.read_csv(
-                uploaded_file, 
-                header=header_index, 
-                encoding='ISO-8859-1', 
-                low_memory=False,
-                sep=separator # Use the file's selected separator
+            df_columns = pa_csv.read_csv(
+                csv_file,
+                read_options=pa_csv.ReadOptions(skip_rows=header_index, encoding='ISO-8859-1'),
+                parse_options=pa_csv.ParseOptions(delimiter=separator),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=column_names, # pyarrow selects columns by name, not position
+                    # Declared types replace Arrow's inference: Date/Time stay the raw text (an
+                    # 'HH:MM' Time would otherwise become a time32 value), PSum is converted to float
+                    column_types={column_names[0]: pa.string(), column_names[1]: pa.string(), column_names[2]: pa.float64()},
+                    null_values=ARROW_NULL_VALUES,
+                    strings_can_be_null=True
+                )
+            ).to_pandas()
+        except (ValueError, KeyError):
+            # pyarrow rejected the file (e.g. a multi-character delimiter, ragged rows or
+            # non-numeric PSum text), or has no column under a probed header name (a blank or
+            # duplicate header cell, or blank lines above the header, which pyarrow counts as rows)
+            df_columns = None
+        
+        if df_columns is not None:
+            # pyarrow parses the three columns in one go; locate Date, Time, PSum by name and
+            # format them in CSV_CHUNK_ROWS slices to bound the intermediate data
+            column_order = df_columns.columns.get_indexer(column_names).tolist()
+            reader = (
+                df_columns.iloc[start:start + CSV_CHUNK_ROWS]
+                for start in range(0, len(df_columns), CSV_CHUNK_ROWS)
+            )
+            final_chunks, valid_dates_count = format_csv_chunks(
+                reader, column_order, columns_to_extract.values(), date_format_string
             )
+        else:
+            # Fall back to the C parser (or the python engine for regex separators) reading in chunks
+            csv_file.seek(0)
             
-            # 2. Check if DataFrame has enough columns
-            max_index = max(col_indices)
-            if df_full.shape[1] < max_index + 1:
-                 st.error(f"File **{filename}** failed to read data correctly. It only has {df_full.shape[1]} columns. This usually means the **CSV Delimiter** ('{separator}') is incorrect for this file.")
-                 continue
-
-            # 3. Extract only the required columns by their index (iloc)
-            df_extracted = df_full.iloc[:, col_indices].copy()
+            # usecols returns the columns in file order, so restore the Date, Time, PSum order
+            file_order = sorted(col_indices)
+            column_order = [file_order.index(i) for i in col_indices]
             
-            # 4. Rename the columns to the final names for output
-            temp_cols = {
-                k: v for k, v in columns_to_extract.items()
+            read_options = {
+                'header': header_index,
+                'encoding': 'ISO-8859-1',
+                'sep': separator,
+                'usecols': col_indices, # The parser skips every other column entirely
+                'chunksize': CSV_CHUNK_ROWS, # Bounds the raw and intermediate data held at once
+                # Keyed by header name: the python engine (used for multi-character or regex
+                # separators) looks positional keys up among the usecols columns only
+                'na_values': {column_names[2]: PSUM_NA_VALUES},
             }
-            df_extracted.columns = temp_cols.values()
-            
-            # 5. Data Cleaning: Convert PSum to numeric, handling potential errors
-            if PSUM_OUTPUT_NAME in df_extracted.columns:
-                df_extracted[PSUM_OUTPUT_NAME] = pd.to_numeric(
-                    df_extracted[PSUM_OUTPUT_NAME], 
-                    errors='coerce' # Convert non-numeric values to NaN
+            # Date/Time are always parsed as text, skipping per-chunk type inference
+            text_dtypes = {column_names[0]: str, column_names[1]: str}
+            try:
+                # Declaring PSum as float lets the C parser convert it while tokenizing
+                reader = pd.read_csv(csv_file, dtype={**text_dtypes, column_names[2]: 'float64'}, **read_options)
+                final_chunks, valid_dates_count = format_csv_chunks(
+                    reader, column_order, columns_to_extract.values(), date_format_string
                 )
+            except ValueError:
+                # PSum contains other non-numeric text, so re-read it as text and coerce it instead
+                csv_file.seek(0)
+                reader = pd.read_csv(csv_file, dtype=text_dtypes, **read_options)
+                final_chunks, valid_dates_count = format_csv_chunks(
+                    reader, column_order, columns_to_extract.values(), date_format_string
+                )
+        
+        # --- CHECK: Verify successful datetime parsing ---
+        if valid_dates_count == 0:
+            return None, None, ('warning', f"File **{filename}**: No valid dates could be parsed. Check the 'Date Format for Parsing' setting (**{config['selected_date_format']}**) and ensure the 'Date' and 'Time' columns contain valid data starting from Row {config['start_row_num']}.")
+        # ---------------------------------------------------
 
-            # 6. Format Date and Time columns separately after parsing for correction
-            combined_dt_str = df_extracted['Date'].astype(str) + ' ' + df_extracted['Time'].astype(str)
+        # Only the compact, already-formatted chunks are kept and joined
+        df_final = pd.concat(final_chunks, ignore_index=True)
 
-            datetime_series = pd.to_datetime(
-                combined_dt_str, 
-                errors='coerce',
-                format=date_format_string 
-            )
-            
-            # --- CHECK: Verify successful datetime parsing ---
-            valid_dates_count = datetime_series.count()
-            if valid_dates_count == 0:
-                st.warning(f"File **{filename}**: No valid dates could be parsed. Check the 'Date Format for Parsing' setting (**{config['selected_date_format']}**) and ensure the 'Date' and 'Time' columns contain valid data starting from Row {config['start_row_num']}.")
-                continue
-            # ---------------------------------------------------
-
-            # GUARANTEE SEPARATION: Create a new DataFrame explicitly with separated columns
-            df_final = pd.DataFrame({
-                'Date': datetime_series.dt.strftime('%d/%m/%Y'), # Output Date is consistently DD/MM/YYYY
-                'Time': datetime_series.dt.strftime('%H:%M:%S'),
-                PSUM_OUTPUT_NAME: df_extracted[PSUM_OUTPUT_NAME] # Keep the PSum data from the original extracted DF
-            })
-
-            # 7. Clean the filename for the Excel sheet name
-            sheet_name = filename.replace('.csv', '').replace('.', '_').strip()[:31]
-            
-            # Use the new, explicitly constructed DataFrame for the output
-            processed_data[sheet_name] = df_final
-            
+        # 7. Clean the filename for the Excel sheet name
+        sheet_name = filename.replace('.csv', '').replace('.', '_').strip()[:31]
+        
+        # Use the new, explicitly constructed DataFrame for the output
+        return sheet_name, df_final, None
+        
+    except Exception as e:
+        # Catch all other unexpected exceptions
+        return None, None, ('error', f"Error processing file **{filename}**. An unexpected error occurred. Error: {e}")
+
+
+# --- Function to Parse All Uploaded Files ---
+@st.cache_data(show_spinner=False, max_entries=5)
+def parse_uploaded_files(file_contents, file_configs):
+    """
+    Validates the configurations and parses a batch of CSV files given as (filename, bytes) pairs.
+    Cached on the file contents and configurations, so re-processing an unchanged batch on a
+    later rerun skips parsing entirely. Returns a list of (sheet_name, DataFrame, message)
+    tuples, with every configuration error ahead of the parse results in upload order.
+    """
+    results = []
+    
+    # Validate every file's configuration before any file is parsed, so all setting errors are shown up front
+    files_to_process = []
+    for (filename, file_bytes), config in zip(file_contents, file_configs):
+        try:
+            settings = parse_file_config(config)
         except ValueError as e:
-            st.error(f"Configuration Error for file **{filename}**: Invalid column letter entered: {e}. Please use valid Excel column notation (e.g., A, C, AA).")
+            results.append((None, None, ('error', f"Configuration Error for file **{filename}**: Invalid column letter entered: {e}. Please use valid Excel column notation (e.g., A, C, AA).")))
             continue
-        except Exception as e:
-            # Catch all other unexpected exceptions
-            st.error(f"Error processing file **{filename}**. An unexpected error occurred. Error: {e}")
+        
+        # Check for unique indices
+        col_indices = {settings['date_col_index'], settings['time_col_index'], settings['ps_um_col_index']}
+        if len(col_indices) != 3:
+            results.append((None, None, ('error', f"Error for file **{filename}**: Date, Time, and PSum must be extracted from three unique column indices. Check columns {config['date_col_str']}, {config['time_col_str']}, {config['psum_col_str']}.")))
             continue
+        
+        files_to_process.append((filename, file_bytes, config, settings))
+    
+    # Files are independent, and pandas releases the GIL while parsing, so threads overlap the work
+    max_workers = max(1, min(len(files_to_process), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(process_single_file, *job) for job in files_to_process]
+        results.extend(future.result() for future in futures)
+    
+    return results
+
+
+# --- Function to Process Data ---
+def process_uploaded_files(uploaded_files, file_configs):
+    """
+    Reads multiple CSV files in parallel, extracts configured columns, cleans PSum data, 
+    and returns a dictionary of DataFrames based on individual file configurations.
+    """
+    processed_data = {}
+    
+    file_contents = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+    results = parse_uploaded_files(file_contents, file_configs)
+    
+    # Streamlit elements must be created from the script thread, so report in order here
+    for sheet_name, df_final, message in results:
+        if message is not None:
+            level, text = message
+            if level == 'warning':
+                st.warning(text)
+            else:
+                st.error(text)
+            continue
+        processed_data[sheet_name] = df_final
             
     return processed_data
 
 
+# --- Helper Function for Caching DataFrames ---
+def hash_dataframe(df):
+    """
+    Returns a compact content fingerprint of a DataFrame for st.cache_data.
+    Uses pandas' vectorized row hashing instead of Streamlit's generic hasher,
+    digested in row order so reordered rows do not share a cache entry.
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return (df.shape, tuple(df.columns), hashlib.blake2b(row_hashes.tobytes(), digest_size=16).hexdigest())
+
+
 # --- Function to Generate Excel File for Download ---
-@st.cache_data
+@st.cache_data(hash_funcs={pd.DataFrame: hash_dataframe})
 def to_excel(data_dict):
     """
     Takes a dictionary of DataFrames and writes them to an in-memory Excel file.
-    The index is NOT included (index=False).
+    The index is NOT included. Cells are written directly with xlsxwriter's
+    typed write_string/write_number methods instead of going through df.to_excel.
     
     Explicitly sets column formats to text using xlsxwriter to prevent merging 
     of Date and Time columns by Excel.
     """
     output = BytesIO()
-    # Use pandas ExcelWriter with 'xlsxwriter' engine
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        for sheet_name, df in data_dict.items():
-            df.to_excel(writer, sheet_name=sheet_name, index=False)
+    # constant_memory keeps only the current row of each sheet in memory. It is not combined
+    # with in_memory, which would override it and buffer every cell again.
+    workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+    
+    # Define a text format (num_format: '@') once and share it across all sheets
+    text_format = workbook.add_format({'num_format': '@'})
+    
+    for sheet_name, df in data_dict.items():
+        worksheet = workbook.add_worksheet(sheet_name)
 
-            # --- Explicitly set column formats to Text (Crucial Fix) ---
-            
-            # Get the xlsxwriter workbook and worksheet objects.
-            workbook = writer.book
-            worksheet = writer.sheets[sheet_name]
-            
-            # Define a text format (num_format: '@')
-            text_format = workbook.add_format({'num_format': '@'})
-            
-            # Find column indices and apply the text format
-            try:
-                if 'Date' in df.columns:
-                    date_col_index = df.columns.get_loc('Date')
-                    # Apply text format to the entire column
-                    worksheet.set_column(date_col_index, date_col_index, 12, text_format) 
-                
-                if 'Time' in df.columns:
-                    time_col_index = df.columns.get_loc('Time')
-                    # Apply text format to the entire column
-                    worksheet.set_column(time_col_index, time_col_index, 10, text_format)
-            except Exception as e:
-                # Log any errors during explicit formatting but don't stop execution
-                print(f"Error applying explicit xlsxwriter formats: {e}")
-            # --------------------------------------------------------
+        # --- Explicitly set column formats to Text (Crucial Fix) ---
+        
+        # Find column indices and apply the text format
+        try:
+            if 'Date' in df.columns:
+                date_col_index = df.columns.get_loc('Date')
+                # Apply text format to the entire column
+                worksheet.set_column(date_col_index, date_col_index, 12, text_format) 
             
+            if 'Time' in df.columns:
+                time_col_index = df.columns.get_loc('Time')
+                # Apply text format to the entire column
+                worksheet.set_column(time_col_index, time_col_index, 10, text_format)
+        except Exception as e:
+            # Log any errors during explicit formatting but don't stop execution
+            print(f"Error applying explicit xlsxwriter formats: {e}")
+        # --------------------------------------------------------
+        
+        # Pick the cell writer matching each column's dtype, skipping write()'s per-cell type dispatch
+        column_writers = []
+        for column in df.columns:
+            series = df[column]
+            values = series.tolist()
+            if pd.api.types.is_numeric_dtype(series):
+                write_cell = worksheet.write_number
+                numbers = series.to_numpy(dtype='float64', na_value=np.nan)
+                infinite = np.isinf(numbers)
+                if infinite.any():
+                    # Excel has no infinity and write_number rejects it, so write it as 'inf'/'-inf' text as df.to_excel did
+                    values = np.where(infinite, np.where(numbers > 0, 'inf', '-inf'), series.to_numpy(dtype=object)).tolist()
+                    write_cell = worksheet.write
+            elif pd.api.types.is_string_dtype(series):
+                write_cell = worksheet.write_string
+            else:
+                write_cell = worksheet.write
+            column_writers.append((write_cell, values, series.notna().tolist()))
+        
+        # constant_memory flushes each row once the next one starts, so write strictly row by row:
+        # the header row first, then the data (missing values are left as blank cells)
+        worksheet.write_row(0, 0, list(df.columns))
+        for row_index in range(len(df)):
+            for col_index, (write_cell, values, present) in enumerate(column_writers):
+                if present[row_index]:
+                    write_cell(row_index + 1, col_index, values[row_index])
+    
+    workbook.close()
     output.seek(0)
     return output.getvalue()
 
@@ -0,0 +1,70 @@
+import unittest
+
+import app
+
+
+# Default settings for a five-column file with PSum in column D
+CONFIG = {
+    'date_col_str': 'A',
+    'time_col_str': 'B',
+    'psum_col_str': 'D',
+    'delimiter_input': ',',
+    'start_row_num': 1,
+    'selected_date_format': 'DD/MM/YYYY',
+}
+
+ROWS = [
+    '01/01/2024,00:00:00,x,1.5,1',
+    '01/01/2024,00:15:00,x,---,2',
+    '02/01/2024,00:30:00,x,7,3',
+]
+
+
+def process(lines, **overrides):
+    """Runs process_single_file on the given CSV lines and returns its (sheet_name, DataFrame, message) result."""
+    config = {**CONFIG, **overrides}
+    file_bytes = ('\n'.join(lines) + '\n').encode('ISO-8859-1')
+    return app.process_single_file('meter.csv', file_bytes, config, app.parse_file_config(config))
+
+
+class ProcessSingleFileTests(unittest.TestCase):
+    def assert_extracted(self, result):
+        sheet_name, df, message = result
+        self.assertIsNone(message)
+        self.assertEqual(sheet_name, 'meter')
+        self.assertEqual(list(df.columns), ['Date', 'Time', app.PSUM_OUTPUT_NAME])
+        self.assertEqual(df['Date'].tolist(), ['01/01/2024', '01/01/2024', '02/01/2024'])
+        self.assertEqual(df['Time'].tolist(), ['00:00:00', '00:15:00', '00:30:00'])
+        self.assertEqual(df[app.PSUM_OUTPUT_NAME].tolist()[::2], [1.5, 7.0])
+        self.assertTrue(df[app.PSUM_OUTPUT_NAME].isna().iloc[1])
+
+    def test_plain_header(self):
+        self.assert_extracted(process(['Date,Time,X,P,Q'] + ROWS))
+
+    def test_blank_header_cell(self):
+        # The header probe names the column 'Unnamed: 3', which pyarrow does not know
+        self.assert_extracted(process(['Date,Time,X,,Q'] + ROWS))
+
+    def test_duplicate_header(self):
+        # The header probe names the second 'P' column 'P.1', which pyarrow does not know
+        self.assert_extracted(process(['Date,Time,P,P,Q'] + ROWS))
+
+    def test_blank_line_above_header(self):
+        # pyarrow counts the blank line when skipping to the header; the C parser does not
+        self.assert_extracted(process(['', 'Meter export,,,,', 'Date,Time,X,P,Q'] + ROWS, start_row_num=2))
+
+    def test_multi_character_delimiter(self):
+        lines = [line.replace(',', ';;') for line in ['Date,Time,X,P,Q'] + ROWS]
+        self.assert_extracted(process(lines, delimiter_input=';;'))
+
+    def test_hh_mm_time_same_on_both_read_paths(self):
+        # Numeric PSum is read by pyarrow; non-numeric PSum text falls back to the C parser.
+        # Both must keep the 'HH:MM' Time as text, so neither accepts it as 'HH:MM:SS'.
+        pyarrow_result = process(['Date,Time,X,P,Q', '01/01/2024,00:00,x,1,1', '01/01/2024,00:15,x,2,2'])
+        fallback_result = process(['Date,Time,X,P,Q', '01/01/2024,00:00,x,1,1', '01/01/2024,00:15,x,n/a?,2'])
+        self.assertEqual(pyarrow_result[2][0], 'warning')
+        self.assertEqual(pyarrow_result, fallback_result)
+
+
+if __name__ == '__main__':
+    unittest.main()